@@ -1,10 +1,30 @@
 import sqlite3
-from collections import defaultdict
-from typing import List, Optional, Dict
+import sys
+from bisect import bisect_left, bisect_right
+from datetime import datetime, timedelta, timezone
+from functools import lru_cache
+from operator import itemgetter
+from typing import List, Optional, Dict, Tuple
 
 from repository import DungeonRepository
 from models import DungeonCompletion
 
+_EPOCH = datetime(1970, 1, 1, tzinfo=timezone.utc)
+# "No run seen yet" marker for the roster load; distinct from a NULL run_id
+_NO_RUN = object()
+
+
+@lru_cache(maxsize=1 << 16)
+def _iso_to_ns(timestamp: str) -> int:
+    """Convert an ISO 8601 timestamp (e.g. 2025-09-24T20:38:11.000Z) to epoch nanoseconds."""
+    dt = datetime.fromisoformat(timestamp.replace("Z", "+00:00"))
+    if dt.tzinfo is None:
+        dt = dt.replace(tzinfo=timezone.utc)
+    return (dt - _EPOCH) // timedelta(microseconds=1) * 1000
+
+def _intern(value):
+    """sys.intern() for str values; anything else (e.g. a NULL column) is returned as is."""
+    return sys.intern(value) if type(value) is str else value
 
 class InMemoryDungeonRepository(DungeonRepository):
     """
@@ -13,13 +33,32 @@ class InMemoryDungeonRepository(DungeonRepository):
     then answers every query from memory with no further I/O.
     """
 
+    # Rows fetched from SQLite per round trip while loading
+    FETCH_SIZE = 50_000
+    # The connection is closed after loading, so forked or pickled copies are safe
+    SHAREABLE_ACROSS_PROCESSES = True
+
     def __init__(self, db_path: str):
-        # character_id -> dungeon_name -> level -> DungeonCompletion
-        self._completions: Dict[str, Dict[str, Dict[int, DungeonCompletion]]] = defaultdict(
-            lambda: defaultdict(dict)
-        )
-        # run_id -> list of character_ids
-        self._rosters: Dict[str, List[str]] = {}
+        # (character_id, dungeon_name, level) -> (first_completed, run_id, first_completed_ns)
+        self._completions: Dict[Tuple[str, str, int], Tuple[str, str, int]] = {}
+        # (character_id, dungeon_name) -> (levels[] ascending, min_ts_suffix[], earliest_suffix[])
+        # where min_ts_suffix[i] / earliest_suffix[i] are the earliest completion time and its
+        # ISO string among levels[i:]
+        self._level_index: Dict[Tuple[str, str], Tuple[List[int], List[int], List[str]]] = {}
+        # character_id -> (completed_at_ns[], dungeon_idx[], levels[]), sorted by time
+        self._timelines: Dict[str, Tuple[List[int], List[int], List[int]]] = {}
+        # dungeon_name <-> small int used in the timelines
+        self._dungeon_index: Dict[str, int] = {}
+        self._dungeon_names: List[str] = []
+        # (dungeons, max_level, min_level) -> character_id -> (step_ts_ns[], step_levels[]),
+        # built lazily: resilience only changes at these completion times
+        self._resilience_steps: Dict[Tuple[Tuple[str, ...], int, int],
+                                     Dict[str, Tuple[List[int], List[int]]]] = {}
+        # Rosters in CSR layout: members of run i are
+        # _roster_members[_roster_offsets[i]:_roster_offsets[i + 1]]
+        self._run_index: Dict[str, int] = {}
+        self._roster_offsets: List[int] = [0]
+        self._roster_members: List[str] = []
 
         self._load(db_path)
 
@@ -30,76 +69,246 @@ class InMemoryDungeonRepository(DungeonRepository):
     def _load(self, db_path: str):
         conn = sqlite3.connect(db_path)
         cursor = conn.cursor()
+        cursor.arraysize = self.FETCH_SIZE
 
-        # Load completions
+        # Load completions with a plain table scan, so characters first appear in
+        # table order (get_all_characters(), and so the written edge files, follow
+        # it); each character's rows are sorted by time afterwards
         cursor.execute("""
             SELECT character_id, dungeon_name, difficulty_level,
                    first_completed, first_run_id
             FROM character_dungeon_stats
         """)
-        for row in cursor.fetchall():
-            comp = DungeonCompletion(
-                character_id=row[0],
-                dungeon_name=row[1],
-                difficulty_level=row[2],
-                first_completed=row[3],
-                run_id=str(row[4]),
-            )
-            self._completions[comp.character_id][comp.dungeon_name][comp.difficulty_level] = comp
+        # character_id -> [(first_completed_ns, dungeon_name, level, first_completed, run_key)]
+        rows_by_char: Dict[str, List[Tuple[int, str, int, str, str]]] = {}
+        # Raw run_id (an integer in the fetcher's DBs, hashed as itself) -> interned str key,
+        # so each run is converted and string-hashed once rather than once per row
+        run_keys: Dict[object, str] = {}
+        while rows := cursor.fetchmany():
+            for character_id, dungeon_name, level, first_completed, run_id in rows:
+                # Intern ids so every reference shares one string object with a cached hash
+                character_id = _intern(character_id)
+                run_key = run_keys.get(run_id)
+                if run_key is None:
+                    run_key = run_keys[run_id] = sys.intern(str(run_id))
+                entries = rows_by_char.get(character_id)
+                if entries is None:
+                    entries = rows_by_char[character_id] = []
+                entries.append((_iso_to_ns(first_completed), _intern(dungeon_name),
+                                level, first_completed, run_key))
 
-        # Load rosters
+        by_char_dungeon: Dict[Tuple[str, str], List[Tuple[int, int, str]]] = {}
+        for character_id, entries in rows_by_char.items():
+            entries.sort(key=itemgetter(0))  # Stable, so equal times keep table order
+            completed_at, dungeon_idx, levels = self._timelines[character_id] = ([], [], [])
+            for ts_ns, dungeon_name, level, first_completed, run_key in entries:
+                key = (character_id, dungeon_name, level)
+                if key in self._completions:
+                    continue  # Keep the earliest row for a (character, dungeon, level)
+                self._completions[key] = (first_completed, run_key, ts_ns)
+
+                completed_at.append(ts_ns)
+                dungeon_idx.append(self._dungeon_idx(dungeon_name))
+                levels.append(level)
+
+                by_char_dungeon.setdefault((character_id, dungeon_name), []).append(
+                    (level, ts_ns, first_completed)
+                )
+        del rows_by_char
+
+        for key, entries in by_char_dungeon.items():
+            entries.sort()
+            min_ts_suffix = [ts_ns for _, ts_ns, _ in entries]
+            earliest_suffix = [first_completed for _, _, first_completed in entries]
+            for i in range(len(entries) - 2, -1, -1):
+                if min_ts_suffix[i + 1] < min_ts_suffix[i]:
+                    min_ts_suffix[i] = min_ts_suffix[i + 1]
+                    earliest_suffix[i] = earliest_suffix[i + 1]
+            self._level_index[key] = ([level for level, _, _ in entries], min_ts_suffix, earliest_suffix)
+
+        # Load rosters; rows arrive grouped by run, so the CSR is filled in one pass.
+        # The same run can still come in two blocks when its id is stored with mixed
+        # SQLite types (5 and '5'); later blocks are set aside and merged afterwards
         cursor.execute("SELECT run_id, character_id FROM roster ORDER BY run_id")
-        temp: Dict[str, List[str]] = defaultdict(list)
-        for row in cursor.fetchall():
-            temp[str(row[0])].append(row[1])
-        self._rosters = dict(temp)
+        last_run = _NO_RUN
+        seen_index = None
+        extra_members: Dict[int, List[str]] = {}
+        while rows := cursor.fetchmany():
+            for run_id, character_id in rows:
+                if run_id != last_run:
+                    last_run = run_id
+                    run_key = run_keys.get(run_id)
+                    if run_key is None:
+                        run_key = run_keys[run_id] = sys.intern(str(run_id))
+                    seen_index = self._run_index.get(run_key)
+                    if seen_index is None:
+                        if self._run_index:
+                            self._roster_offsets.append(len(self._roster_members))
+                        self._run_index[run_key] = len(self._run_index)
+                if seen_index is None:
+                    self._roster_members.append(_intern(character_id))
+                else:
+                    extra_members.setdefault(seen_index, []).append(_intern(character_id))
+        if self._run_index:
+            self._roster_offsets.append(len(self._roster_members))
+        if extra_members:
+            self._merge_roster_members(extra_members)
 
         conn.close()
 
+    def _merge_roster_members(self, extra_members: Dict[int, List[str]]):
+        """Rebuild the roster CSR with each run's extra members appended after its own."""
+        members: List[str] = []
+        offsets = [0]
+        for i in range(len(self._run_index)):
+            members.extend(self._roster_members[self._roster_offsets[i]:self._roster_offsets[i + 1]])
+            members.extend(extra_members.get(i, ()))
+            offsets.append(len(members))
+        self._roster_members = members
+        self._roster_offsets = offsets
+
+    def _dungeon_idx(self, dungeon_name: str) -> int:
+        idx = self._dungeon_index.get(dungeon_name)
+        if idx is None:
+            idx = self._dungeon_index[dungeon_name] = len(self._dungeon_names)
+            self._dungeon_names.append(dungeon_name)
+        return idx
+
     # ------------------------------------------------------------------ #
     #  DungeonRepository interface
     # ------------------------------------------------------------------ #
 
     def get_all_characters(self) -> List[str]:
-        return list(self._completions.keys())
+        return list(self._timelines.keys())
 
     def get_completion(self, character_id: str, dungeon: str, level: int) -> Optional[DungeonCompletion]:
-        return self._completions.get(character_id, {}).get(dungeon, {}).get(level)
+        row = self._completions.get((character_id, dungeon, level))
+        if row is None:
+            return None
+        first_completed, run_id, _ = row
+        return DungeonCompletion(
+            character_id=character_id,
+            dungeon_name=dungeon,
+            difficulty_level=level,
+            first_completed=first_completed,
+            run_id=run_id,
+        )
 
     def has_higher_completion(self, character_id: str, dungeon: str, level: int, before: str) -> bool:
-        dungeon_levels = self._completions.get(character_id, {}).get(dungeon, {})
-        for comp_level, comp in dungeon_levels.items():
-            if comp_level > level and comp.first_completed < before:
-                return True
-        return False
+        index = self._level_index.get((character_id, dungeon))
+        if index is None:
+            return False
+        levels, min_ts_suffix, _ = index
+        i = bisect_right(levels, level)  # first entry strictly above `level`
+        return i < len(levels) and min_ts_suffix[i] < _iso_to_ns(before)
+
+    def scan_character_completions(self, character_id: str, target_level: int,
+                                   dungeons: List[str]) -> List[DungeonCompletion]:
+        # Completion lookup and higher-level check share the level index and
+        # compare epoch-ns directly, with no ISO round trip in between
+        result = []
+        for dungeon in dungeons:
+            row = self._completions.get((character_id, dungeon, target_level))
+            if row is None:
+                continue
+            first_completed, run_id, first_completed_ns = row
+            levels, min_ts_suffix, _ = self._level_index[(character_id, dungeon)]
+            i = bisect_right(levels, target_level)
+            if i < len(levels) and min_ts_suffix[i] < first_completed_ns:
+                continue
+            result.append(DungeonCompletion(
+                character_id=character_id,
+                dungeon_name=dungeon,
+                difficulty_level=target_level,
+                first_completed=first_completed,
+                run_id=run_id,
+            ))
+        return result
 
     def get_max_level_by_dungeon(self, character_id: str, dungeons: List[str],
                                   max_level: int, min_level: int, before: str) -> Dict[str, int]:
-        result = {}
-        char_completions = self._completions.get(character_id, {})
+        timeline = self._timelines.get(character_id)
+        if timeline is None:
+            return {}
+
+        # Single sweep over every completion strictly before the cutoff
+        completed_at, dungeon_idx, levels = timeline
+        cutoff = bisect_left(completed_at, _iso_to_ns(before))
+        best = [0] * len(self._dungeon_names)
+        for idx, level in zip(dungeon_idx[:cutoff], levels[:cutoff]):
+            if min_level <= level <= max_level and level > best[idx]:
+                best[idx] = level
 
+        result = {}
         for dungeon in dungeons:
-            dungeon_levels = char_completions.get(dungeon, {})
-            best = 0
-            for level, comp in dungeon_levels.items():
-                if min_level <= level <= max_level and comp.first_completed < before:
-                    best = max(best, level)
-            if best > 0:
-                result[dungeon] = best
+            idx = self._dungeon_index.get(dungeon)
+            if idx is not None and best[idx] > 0:
+                result[dungeon] = best[idx]
 
         return result
 
+    def get_resilience_level(self, character_id: str, dungeons: List[str],
+                             max_level: int, min_level: int, before: str) -> int:
+        steps_by_char = self._resilience_steps.setdefault((tuple(dungeons), max_level, min_level), {})
+        steps = steps_by_char.get(character_id)
+        if steps is None:
+            steps = steps_by_char[character_id] = self._build_resilience_steps(
+                character_id, dungeons, max_level, min_level
+            )
+        step_ts, step_levels = steps
+        k = bisect_left(step_ts, _iso_to_ns(before))
+        return step_levels[k - 1] if k else 0
+
+    def prepare_resilience_levels(self, dungeons: List[str], max_level: int, min_level: int):
+        # Build every character's steps up front, e.g. in a parent process before
+        # forking workers, so the index is shared with them and outlives their pool
+        steps_by_char = self._resilience_steps.setdefault((tuple(dungeons), max_level, min_level), {})
+        for character_id in self._timelines:
+            if character_id not in steps_by_char:
+                steps_by_char[character_id] = self._build_resilience_steps(
+                    character_id, dungeons, max_level, min_level
+                )
+
+    def _build_resilience_steps(self, character_id: str, dungeons: List[str],
+                                max_level: int, min_level: int) -> Tuple[List[int], List[int]]:
+        """Replay a character's timeline once, recording each time its resilience level changes."""
+        step_ts: List[int] = []
+        step_levels: List[int] = []
+        timeline = self._timelines.get(character_id)
+        wanted = {self._dungeon_index.get(dungeon) for dungeon in dungeons}
+        if timeline is None or None in wanted or len(wanted) < len(dungeons):
+            return step_ts, step_levels
+
+        best = dict.fromkeys(wanted, 0)
+        missing = len(best)
+        current = 0
+        for ts, idx, level in zip(*timeline):
+            if idx not in best or not (min_level <= level <= max_level) or level <= best[idx]:
+                continue
+            if best[idx] == 0:
+                missing -= 1
+            best[idx] = level
+            if missing == 0:
+                resilience = min(best.values())
+                if resilience != current:
+                    step_ts.append(ts)
+                    step_levels.append(resilience)
+                    current = resilience
+        return step_ts, step_levels
+
     def get_min_completion_date(self, character_id: str, dungeon: str, min_level: int) -> Optional[str]:
-        dungeon_levels = self._completions.get(character_id, {}).get(dungeon, {})
-        earliest = None
-        for level, comp in dungeon_levels.items():
-            if level >= min_level:
-                if earliest is None or comp.first_completed < earliest:
-                    earliest = comp.first_completed
-        return earliest
+        index = self._level_index.get((character_id, dungeon))
+        if index is None:
+            return None
+        levels, _, earliest_suffix = index
+        i = bisect_left(levels, min_level)  # first entry at or above `min_level`
+        return earliest_suffix[i] if i < len(levels) else None
 
     def get_roster(self, run_id: str) -> List[str]:
-        return self._rosters.get(run_id, [])
+        i = self._run_index.get(run_id)
+        if i is None:
+            return []
+        return self._roster_members[self._roster_offsets[i]:self._roster_offsets[i + 1]]
 
     def close(self):
         pass  # Nothing to close — all in memory
\ No newline at end of file
@@ -1,9 +1,15 @@
 import argparse
 import json
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, replace
+from typing import List, Optional
 
-from models import PropagationEdge
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+from models import EdgeGroups
+from repository import DungeonRepository
 from inmemory_repository import InMemoryDungeonRepository
 from services import ResilienceCalculator, PropagationGraphBuilder
 
@@ -13,9 +19,13 @@ class Config:
     season: str = "tww-season3"
     resi_key_level: int = 20
     max_level: int = 25
+    workers: int = 1  # processes used to build the propagation graph
+    db_path_override: Optional[str] = None  # read this DB instead of the derived db_path
 
     @property
     def db_path(self) -> str:
+        if self.db_path_override:
+            return self.db_path_override
         return f"{self.season}-{self.region}_mapped.db"
 
     @property
@@ -34,6 +44,7 @@ class ConfigLoader:
             season=data.get("season", "tww-season3"),
             resi_key_level=data.get("resi_key_level", 20),
             max_level=data.get("max_level", 25),
+            workers=data.get("workers", 1),
         )
 
 class DungeonConfigLoader:
@@ -49,19 +60,23 @@ class EdgeSerializer:
     """Utility class for serializing edges to JSON."""
     
     @staticmethod
-    def serialize(edges: List, dungeon_short: dict[str, str]) -> List[dict]:
-        """Group edges by (source, target) and collect labels."""
-        from collections import defaultdict
-        
-        edge_groups = defaultdict(list)
-        for edge in edges:
-            key = (edge.source, edge.target)
-            edge_groups[key].append(edge.to_label(dungeon_short))
-        
+    def serialize(edges: EdgeGroups, dungeon_short: dict[str, str]) -> List[dict]:
+        """Emit one record per (source, target) with a label per (dungeon, run_id)."""
+        # Build each dungeon's "SHORT#" prefix once rather than per label
+        prefix = {dungeon: f"{short}#" for dungeon, short in dungeon_short.items()}
         return [
-            {"source": src, "target": tgt, "labels": labels}
-            for (src, tgt), labels in edge_groups.items()
+            {
+                "source": src,
+                "target": tgt,
+                "labels": [f"{prefix[dungeon]}{run_id}" for dungeon, run_id in runs],
+            }
+            for (src, tgt), runs in edges.items()
         ]
+    
+    @staticmethod
+    def count(edges: EdgeGroups) -> int:
+        """Number of individual (source, target, dungeon, run_id) edges."""
+        return sum(len(runs) for runs in edges.values())
 
 class ResultWriter:
     
@@ -70,15 +85,24 @@ class ResultWriter:
     
     def write_timestamps(self, timestamps: dict[str, str]):
         filepath = f"{self.output_prefix}_timestamps.json"
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(timestamps, f, ensure_ascii=False, indent=2, sort_keys=True)
+        self._write_json(filepath, timestamps, sort_keys=True)
         return filepath
     
     def write_edges(self, edges: List[dict], edge_type: str):
         filepath = f"{self.output_prefix}_{edge_type}_edges.json"
-        with open(filepath, "w", encoding="utf-8") as f:
-            json.dump(edges, f, ensure_ascii=False, indent=2)
+        self._write_json(filepath, edges)
         return filepath
+    
+    @staticmethod
+    def _write_json(filepath: str, data, sort_keys: bool = False):
+        """Write data as 2-space indented UTF-8 JSON; orjson and json produce identical bytes."""
+        if orjson is not None:
+            option = orjson.OPT_INDENT_2 | (orjson.OPT_SORT_KEYS if sort_keys else 0)
+            with open(filepath, "wb") as f:
+                f.write(orjson.dumps(data, option=option))
+            return
+        with open(filepath, "w", encoding="utf-8") as f:
+            json.dump(data, f, ensure_ascii=False, indent=2, sort_keys=sort_keys)
 
 class AnalysisOrchestrator:
     """
@@ -86,13 +110,17 @@ class AnalysisOrchestrator:
     Coordinates the entire analysis workflow.
     """
     
-    def __init__(self, config: Config, dungeons: List[str], dungeon_short: dict[str, str]):
+    def __init__(self, config: Config, dungeons: List[str], dungeon_short: dict[str, str],
+                 repository: Optional[DungeonRepository] = None):
         self.config = config
         self.dungeons = dungeons
         self.dungeon_short = dungeon_short
         
-        # Dependency Injection - components can be swapped for testing
-        self.repository = InMemoryDungeonRepository(config.db_path)
+        # Dependency Injection - components can be swapped for testing, and a
+        # loaded repository can be shared across key levels
+        if repository is None:
+            repository = InMemoryDungeonRepository(config.db_path)
+        self.repository = repository
         self.resilience_calculator = ResilienceCalculator(self.repository)
         self.graph_builder = PropagationGraphBuilder(self.repository, self.resilience_calculator)
         self.result_writer = ResultWriter(config.output_prefix)
@@ -113,25 +141,26 @@ class AnalysisOrchestrator:
         
         # Step 3: Build propagation graph
         resilient_edges, non_resilient_edges = self._build_propagation_graph(characters, timestamps)
-        print(f"Built {len(resilient_edges)} resilient edges and {len(non_resilient_edges)} non-resilient edges")
+        print(f"Built {EdgeSerializer.count(resilient_edges)} resilient edges and "
+              f"{EdgeSerializer.count(non_resilient_edges)} non-resilient edges")
         
         # Step 4: Serialize and write results
         results = self._write_results(timestamps, resilient_edges, non_resilient_edges)
         
         return results
     
+    def run_for_level(self, key_level: int) -> dict:
+        """Run the pipeline at another key level, reusing the loaded repository and caches."""
+        self.config = replace(self.config, resi_key_level=key_level)
+        self.result_writer = ResultWriter(self.config.output_prefix)
+        return self.run_analysis()
+    
     def _find_resilient_timestamps(self, characters: List[str]) -> dict[str, str]:
         """Find when each character achieved resilience."""
-        timestamps = {}
-        
-        for character_id in characters:
-            date = self.resilience_calculator.find_resilience_achievement_date(
-                character_id, self.config.resi_key_level, self.dungeons
-            )
-            if date:
-                timestamps[character_id] = date
-        
-        return timestamps
+        dates = self.resilience_calculator.find_resilience_achievement_dates(
+            self.config.resi_key_level, self.dungeons
+        )
+        return {character_id: dates[character_id] for character_id in characters if character_id in dates}
     
     def _build_propagation_graph(self, characters: List[str],
                                 timestamps: dict[str, str]) -> tuple:
@@ -141,13 +170,14 @@ class AnalysisOrchestrator:
             resilient_timestamps=timestamps,
             dungeons=self.dungeons,
             target_level=self.config.resi_key_level,
-            max_level=self.config.max_level
+            max_level=self.config.max_level,
+            workers=self.config.workers
         )
         
         return resilient_edges, non_resilient_edges
     
-    def _write_results(self, timestamps: dict, resilient_edges: List, 
-                      non_resilient_edges: List) -> dict:
+    def _write_results(self, timestamps: dict, resilient_edges: EdgeGroups, 
+                      non_resilient_edges: EdgeGroups) -> dict:
         """Serialize and write all results to disk."""
         # Write timestamps
         ts_file = self.result_writer.write_timestamps(timestamps)
@@ -169,8 +199,8 @@ class AnalysisOrchestrator:
             "down_edges_file": down_file,
             "non_resil_edges_file": non_resil_file,
             "character_count": len(timestamps),
-            "resilient_edge_count": len(resilient_edges),
-            "non_resilient_edge_count": len(non_resilient_edges)
+            "resilient_edge_count": EdgeSerializer.count(resilient_edges),
+            "non_resilient_edge_count": EdgeSerializer.count(non_resilient_edges)
         }
     
     def cleanup(self):
@@ -181,6 +211,7 @@ def parse_args():
     parser.add_argument("--region", help="Region code, e.g. eu or us")
     parser.add_argument("--season", help="Season identifier, e.g. tww-season3")
     parser.add_argument("--resi-key-level", type=int, help="Resilience key level threshold")
+    parser.add_argument("--workers", type=int, help="Processes used to build the propagation graph (default 1)")
     return parser.parse_args()
 
 def load_config(args) -> Config:
@@ -189,7 +220,8 @@ def load_config(args) -> Config:
         return Config(
             region=args.region,
             season=args.season,
-            resi_key_level=args.resi_key_level
+            resi_key_level=args.resi_key_level,
+            workers=args.workers or 1
         )
 
     # Otherwise, fallback to JSON
@@ -200,6 +232,7 @@ def load_config(args) -> Config:
         season=data.get("season", "tww-season3"),
         resi_key_level=data.get("resi_key_level", 20),
         max_level=data.get("max_level", 25),
+        workers=args.workers or data.get("workers", 1),
     )
 
 def main():
@@ -208,25 +241,17 @@ def main():
     orchestrator = None
 
     try:
-        base_config = config = load_config(args)
+        base_config = load_config(args)
         dungeons, dungeon_short = DungeonConfigLoader.load()
+
+        # The data is identical for every key level, so load it only once
+        orchestrator = AnalysisOrchestrator(base_config, dungeons, dungeon_short)
         
         for key_level in range(base_config.resi_key_level, base_config.max_level + 1):
 
-            config = Config(
-                region=base_config.region,
-                season=base_config.season,
-                resi_key_level=key_level,
-                max_level=base_config.max_level
-            )
-
             print(f"\n🎯 Running analysis for resilience key level {key_level} ...")
 
-            orchestrator = AnalysisOrchestrator(config, dungeons, dungeon_short)
-            results = orchestrator.run_analysis()
-
-            orchestrator.cleanup()
-            orchestrator = None
+            results = orchestrator.run_for_level(key_level)
         
     except Exception as e:
         print(f"❌ Error: {e}")
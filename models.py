@@ -1,12 +1,12 @@
 from dataclasses import dataclass
-from typing import Optional
+from typing import Dict, Tuple
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class Character:
     """Represents a WoW character."""
     character_id: str
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class DungeonCompletion:
     """Represents a completed dungeon run."""
     character_id: str
@@ -15,14 +15,14 @@ class DungeonCompletion:
     first_completed: str  # ISO 8601 format: 2025-09-24T20:38:11.000Z
     run_id: str
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class ResilienceAchievement:
     """Represents when a character achieved resilience."""
     character_id: str
     date_achieved: str  # YYYY-MM-DD format
     level: int
 
-@dataclass(frozen=True)
+@dataclass(frozen=True, slots=True)
 class PropagationEdge:
     """Represents an influence edge between two characters."""
     source: str
@@ -31,4 +31,7 @@ class PropagationEdge:
     run_id: str
     
     def to_label(self, dungeon_short: dict[str, str]) -> str:
-        return f"{dungeon_short[self.dungeon]}#{self.run_id}"
\ No newline at end of file
+        return f"{dungeon_short[self.dungeon]}#{self.run_id}"
+
+# (source, target) -> ordered set of (dungeon, run_id); dict keys keep output order deterministic
+EdgeGroups = Dict[Tuple[str, str], Dict[Tuple[str, str], None]]
\ No newline at end of file
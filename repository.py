@@ -1,10 +1,14 @@
 from abc import ABC, abstractmethod
-from typing import List, Optional
+from typing import Dict, List, Optional
 from models import DungeonCompletion
 
 class DungeonRepository(ABC):
     """Abstract repository for dungeon data access."""
     
+    # Whether a copy of the repository can be used from worker processes (no open
+    # connections or other per-process handles); required by parallel edge building
+    SHAREABLE_ACROSS_PROCESSES = False
+    
     @abstractmethod
     def get_all_characters(self) -> List[str]:
         """Get all unique character IDs."""
@@ -20,17 +24,62 @@ class DungeonRepository(ABC):
         """Check if character completed higher level before given time (ISO 8601 string)."""
         pass
     
+    def scan_character_completions(self, character_id: str, target_level: int,
+                                   dungeons: List[str]) -> List[DungeonCompletion]:
+        """Get completions at target_level not preceded by a higher completion of the same dungeon."""
+        result = []
+        for dungeon in dungeons:
+            completion = self.get_completion(character_id, dungeon, target_level)
+            if completion and not self.has_higher_completion(
+                character_id, dungeon, target_level, completion.first_completed
+            ):
+                result.append(completion)
+        return result
+    
     @abstractmethod
     def get_max_level_by_dungeon(self, character_id: str, dungeons: List[str], 
                                   max_level: int, min_level: int, before: str) -> dict[str, int]:
         """Get maximum completed level for each dungeon before timestamp (ISO 8601 string)."""
         pass
     
+    def get_resilience_level(self, character_id: str, dungeons: List[str],
+                             max_level: int, min_level: int, before: str) -> int:
+        """Get the minimum of the per-dungeon max levels before timestamp, or 0 if a dungeon is missing."""
+        max_levels = self.get_max_level_by_dungeon(character_id, dungeons, max_level, min_level, before)
+        if len(max_levels) < len(dungeons):
+            return 0
+        return min(max_levels.values())
+    
+    def prepare_resilience_levels(self, dungeons: List[str], max_level: int, min_level: int):
+        """Precompute get_resilience_level lookups for every character (optional, no-op by default)."""
+        pass
+    
     @abstractmethod
     def get_min_completion_date(self, character_id: str, dungeon: str, min_level: int) -> Optional[str]:
         """Get earliest date character completed dungeon at min_level or higher (ISO 8601 string)."""
         pass
     
+    def get_resilience_achievement_time(self, character_id: str, dungeons: List[str],
+                                        min_level: int) -> Optional[str]:
+        """Get the latest first completion at min_level or higher across dungeons (ISO 8601)."""
+        completion_dates = []
+        for dungeon in dungeons:
+            iso_timestamp = self.get_min_completion_date(character_id, dungeon, min_level)
+            if not iso_timestamp:
+                return None  # Didn't complete all dungeons at required level
+            completion_dates.append(iso_timestamp)
+        # Latest completion determines when resilience was achieved
+        return max(completion_dates)
+    
+    def get_resilience_achievement_times(self, dungeons: List[str], min_level: int) -> Dict[str, str]:
+        """Get get_resilience_achievement_time for every character that has one."""
+        result = {}
+        for character_id in self.get_all_characters():
+            iso_timestamp = self.get_resilience_achievement_time(character_id, dungeons, min_level)
+            if iso_timestamp:
+                result[character_id] = iso_timestamp
+        return result
+    
     @abstractmethod
     def get_roster(self, run_id: str) -> List[str]:
         """Get all character IDs in a dungeon run."""
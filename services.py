@@ -1,8 +1,9 @@
+from concurrent.futures import ProcessPoolExecutor, as_completed
 from typing import List, Optional, Dict, Tuple
 from tqdm import tqdm
 
 from repository import DungeonRepository
-from models import PropagationEdge
+from models import EdgeGroups
 
 class ResilienceCalculator:
     """Service for calculating resilience levels."""
@@ -20,15 +21,13 @@ class ResilienceCalculator:
         Args:
             timestamp: ISO 8601 string (e.g., "2025-09-24T20:38:11.000Z")
         """
-        max_levels = self.repository.get_max_level_by_dungeon(
+        return self.repository.get_resilience_level(
             character_id, dungeons, max_level, min_level, timestamp
         )
-        
-        # If not all dungeons completed, resilience is 0
-        if len(max_levels) < len(dungeons):
-            return 0
-        
-        return min(max_levels.values())
+    
+    def prepare(self, dungeons: List[str], max_level: int, min_level: int = 12):
+        """Let the repository precompute calculate_resilience_level lookups for these arguments."""
+        self.repository.prepare_resilience_levels(dungeons, max_level, min_level)
     
     def find_resilience_achievement_date(self, character_id: str, min_level: int,
                                         dungeons: List[str]) -> Optional[str]:
@@ -38,70 +37,115 @@ class ResilienceCalculator:
         
         Returns: YYYY-MM-DD format string
         """
-        completion_dates = []
-        
-        for dungeon in dungeons:
-            iso_timestamp = self.repository.get_min_completion_date(character_id, dungeon, min_level)
-            if not iso_timestamp:
-                return None  # Didn't complete all dungeons at required level
-            completion_dates.append(iso_timestamp)
+        iso_timestamp = self.repository.get_resilience_achievement_time(character_id, dungeons, min_level)
+        if not iso_timestamp:
+            return None
+        return iso_timestamp[:10]  # Date part of the ISO 8601 string
+    
+    def find_resilience_achievement_dates(self, min_level: int, dungeons: List[str]) -> Dict[str, str]:
+        """
+        Batch form of find_resilience_achievement_date for every character,
+        letting the repository answer in one pass (a single query for SQLite).
         
-        # Latest completion determines when resilience was achieved
-        latest_timestamp = max(completion_dates)
-        return latest_timestamp.split("T")[0]
+        Returns: character_id -> YYYY-MM-DD for characters that achieved resilience
+        """
+        times = self.repository.get_resilience_achievement_times(dungeons, min_level)
+        return {character_id: iso_timestamp[:10] for character_id, iso_timestamp in times.items()}
 
 class PropagationGraphBuilder:
     """Service for building propagation graphs."""
     
+    # Shards per worker process; more shards smooth out uneven character workloads
+    SHARDS_PER_WORKER = 4
+    
     def __init__(self, repository: DungeonRepository, resilience_calculator: ResilienceCalculator):
         self.repository = repository
         self.resilience_calculator = resilience_calculator
     
     def build_edges(self, characters: List[str], resilient_timestamps: Dict[str, str],
-                   dungeons: List[str], target_level: int, max_level: int) -> Tuple[List[PropagationEdge], List[PropagationEdge]]:
+                   dungeons: List[str], target_level: int, max_level: int,
+                   workers: int = 1) -> Tuple[EdgeGroups, EdgeGroups]:
         """
         Build propagation edges showing who influenced whom.
+        Edges are grouped by (source, target) as they are found, and a repeated
+        (dungeon, run_id) for the same pair is only recorded once.
+        With workers > 1, characters are sharded across that many processes;
+        the result is identical to the single-process run. This needs a repository
+        with SHAREABLE_ACROSS_PROCESSES set (e.g. the in-memory one).
         Returns (resilient_edges, non_resilient_edges).
         """
-        resilient_edges = []
-        non_resilient_edges = []
+        if workers > 1 and not self.repository.SHAREABLE_ACROSS_PROCESSES:
+            raise ValueError(
+                f"{type(self.repository).__name__} cannot be shared with worker processes; use workers=1"
+            )
+        if workers <= 1 or len(characters) < 2:
+            return self._build_edges_for(
+                tqdm(characters, desc="Building edges"),
+                resilient_timestamps, dungeons, target_level, max_level
+            )
+        
+        # Build the repository's lookups here rather than lazily in each worker, so
+        # the workers inherit them and they are kept for later calls (other key levels)
+        self.resilience_calculator.prepare(dungeons, max_level)
+        
+        shard_size = -(-len(characters) // (workers * self.SHARDS_PER_WORKER))
+        shards = [characters[i:i + shard_size] for i in range(0, len(characters), shard_size)]
         
-        for character_id in tqdm(characters, desc="Building edges"):
-            is_resilient = character_id in resilient_timestamps
+        with ProcessPoolExecutor(
+            max_workers=workers,
+            initializer=_init_edge_worker,
+            initargs=(self, resilient_timestamps, dungeons, target_level, max_level),
+        ) as executor:
+            futures = [executor.submit(_build_edges_shard, shard) for shard in shards]
+            shard_sizes = {future: len(shard) for future, shard in zip(futures, shards)}
+            with tqdm(total=len(characters), desc="Building edges") as progress:
+                for future in as_completed(futures):
+                    progress.update(shard_sizes[future])
+            results = [future.result() for future in futures]
+        
+        # Shards hold disjoint targets, so merging in shard order reproduces the serial output
+        resilient_edges: EdgeGroups = {}
+        non_resilient_edges: EdgeGroups = {}
+        for shard_resilient, shard_non_resilient in results:
+            resilient_edges.update(shard_resilient)
+            non_resilient_edges.update(shard_non_resilient)
+        return resilient_edges, non_resilient_edges
+    
+    def _build_edges_for(self, characters, resilient_timestamps: Dict[str, str],
+                         dungeons: List[str], target_level: int, max_level: int) -> Tuple[EdgeGroups, EdgeGroups]:
+        resilient_edges: EdgeGroups = {}
+        non_resilient_edges: EdgeGroups = {}
+        
+        # Bind hot-loop methods to locals once instead of resolving self.x.y per iteration
+        scan_completions = self.repository.scan_character_completions
+        get_roster = self.repository.get_roster
+        calculate_resilience = self.resilience_calculator.calculate_resilience_level
+        
+        for character_id in characters:
+            edges = resilient_edges if character_id in resilient_timestamps else non_resilient_edges
             
-            for dungeon in dungeons:
-                completion = self.repository.get_completion(character_id, dungeon, target_level)
-                if not completion:
-                    continue
-                
-                # Skip if completed higher level earlier
-                if self.repository.has_higher_completion(
-                    character_id, dungeon, target_level, completion.first_completed
-                ):
-                    continue
+            # Completions at target level, skipping dungeons where a higher level came earlier
+            for completion in scan_completions(character_id, target_level, dungeons):
+                label = (completion.dungeon_name, completion.run_id)
+                timestamp = completion.first_completed
                 
                 # Check group members
-                roster = self.repository.get_roster(completion.run_id)
-                
-                for other_id in roster:
+                for other_id in get_roster(completion.run_id):
                     if other_id == character_id:
                         continue
-                    
-                    other_resilience = self.resilience_calculator.calculate_resilience_level(
-                        other_id, completion.first_completed, dungeons, max_level
-                    )
-                    
-                    if other_resilience >= target_level:
-                        edge = PropagationEdge(
-                            source=other_id,
-                            target=character_id,
-                            dungeon=dungeon,
-                            run_id=completion.run_id
-                        )
-                        
-                        if is_resilient:
-                            resilient_edges.append(edge)
-                        else:
-                            non_resilient_edges.append(edge)
+                    if calculate_resilience(other_id, timestamp, dungeons, max_level) >= target_level:
+                        edges.setdefault((other_id, character_id), {})[label] = None
         
-        return resilient_edges, non_resilient_edges
\ No newline at end of file
+        return resilient_edges, non_resilient_edges
+
+# Per-process state for parallel build_edges, set once by the pool initializer
+_edge_worker_state: Optional[tuple] = None
+
+def _init_edge_worker(builder: PropagationGraphBuilder, resilient_timestamps: Dict[str, str],
+                      dungeons: List[str], target_level: int, max_level: int):
+    global _edge_worker_state
+    _edge_worker_state = (builder, resilient_timestamps, dungeons, target_level, max_level)
+
+def _build_edges_shard(characters: List[str]) -> Tuple[EdgeGroups, EdgeGroups]:
+    builder, resilient_timestamps, dungeons, target_level, max_level = _edge_worker_state
+    return builder._build_edges_for(characters, resilient_timestamps, dungeons, target_level, max_level)
\ No newline at end of file
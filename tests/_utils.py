@@ -0,0 +1,6 @@
+"""Shared helpers for the test suite."""
+
+
+def index_edges(result: list[dict]) -> dict[tuple[str, str], dict]:
+    """Index serialized edge groups by (source, target) for O(1) lookups in assertions."""
+    return {(group["source"], group["target"]): group for group in result}
@@ -1,10 +1,12 @@
 import unittest
 import tempfile
+import warnings
 import sqlite3
 from pathlib import Path
 
 from models import *
 from sqlite_repository import SQLiteDungeonRepository
+from inmemory_repository import InMemoryDungeonRepository
 from services import ResilienceCalculator, PropagationGraphBuilder
 from main import AnalysisOrchestrator, Config
 
@@ -132,6 +134,11 @@ class TestIntegration(unittest.TestCase):
             calculator.find_resilience_achievement_date("char3", 20, self.dungeons)
         )
 
+        self.assertEqual(
+            calculator.find_resilience_achievement_dates(20, self.dungeons),
+            {"char1": "2025-01-03", "char2": "2025-01-06"}
+        )
+
     #def test_timestamp_string_comparison(self):
     #    self.assertTrue("2025-01-01T12:00:00.000Z" < "2025-01-02T12:00:00.000Z")
     #    self.assertTrue("2025-01-01T12:00:00.000Z" < "2025-01-01T13:00:00.000Z")
@@ -153,6 +160,148 @@ class TestIntegration(unittest.TestCase):
             max_level=25
         )
 
-        self.assertTrue(any(
-            e.source == "char1" and e.target == "char2" for e in resilient_edges
-        ))
+        self.assertIn(("char1", "char2"), resilient_edges)
+        self.assertEqual(resilient_edges[("char1", "char2")], {("Dungeon A", "run4"): None})
+
+    def test_edge_building_skips_null_roster_members(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.execute("INSERT INTO roster VALUES ('run4', NULL)")
+        conn.commit()
+        conn.close()
+        repo = InMemoryDungeonRepository(self.db_path)
+        builder = PropagationGraphBuilder(repo, ResilienceCalculator(repo))
+
+        # Comparing str to None must not fall back to NotImplemented's truthiness
+        with warnings.catch_warnings():
+            warnings.simplefilter("error")
+            resilient_edges, _ = builder.build_edges(
+                characters=["char1", "char2", "char3"],
+                resilient_timestamps={"char1": "2025-01-03", "char2": "2025-01-06"},
+                dungeons=self.dungeons,
+                target_level=20,
+                max_level=25
+            )
+
+        self.assertEqual(resilient_edges, {("char1", "char2"): {("Dungeon A", "run4"): None}})
+
+    def test_parallel_edge_building_matches_serial(self):
+        repo = InMemoryDungeonRepository(self.db_path)
+        builder = PropagationGraphBuilder(repo, ResilienceCalculator(repo))
+        kwargs = dict(
+            characters=["char1", "char2", "char3"],
+            resilient_timestamps={"char1": "2025-01-03", "char2": "2025-01-06"},
+            dungeons=self.dungeons,
+            target_level=20,
+            max_level=25
+        )
+
+        self.assertEqual(builder.build_edges(**kwargs, workers=2), builder.build_edges(**kwargs))
+
+    def test_parallel_edge_building_keeps_resilience_index_in_parent(self):
+        repo = InMemoryDungeonRepository(self.db_path)
+        builder = PropagationGraphBuilder(repo, ResilienceCalculator(repo))
+
+        builder.build_edges(["char1", "char2", "char3"], {}, self.dungeons, 20, 25, workers=2)
+
+        steps_by_char = repo._resilience_steps[(tuple(self.dungeons), 25, 12)]
+        self.assertEqual(set(steps_by_char), {"char1", "char2", "char3"})
+
+    def test_parallel_edge_building_rejects_sqlite_repository(self):
+        repo = self._get_repo()
+        builder = PropagationGraphBuilder(repo, ResilienceCalculator(repo))
+
+        with self.assertRaises(ValueError):
+            builder.build_edges(["char1", "char2"], {}, self.dungeons, 20, 25, workers=2)
+
+    def test_inmemory_keeps_table_order_of_characters(self):
+        conn = sqlite3.connect(self.db_path)
+        # Appended last but sorts first, and earlier than char1's rows
+        conn.execute("""
+            INSERT INTO character_dungeon_stats
+            VALUES ('char0', 'Dungeon A', 18, '2024-12-01T12:00:00.000Z', 'run0')
+        """)
+        conn.commit()
+        rows = conn.execute("SELECT character_id FROM character_dungeon_stats ORDER BY rowid").fetchall()
+        conn.close()
+
+        self.assertEqual(
+            InMemoryDungeonRepository(self.db_path).get_all_characters(),
+            list(dict.fromkeys(row[0] for row in rows)),
+        )
+
+    def test_inmemory_roster_merges_mixed_type_run_ids(self):
+        conn = sqlite3.connect(self.db_path)
+        # No column affinity, so 5 and '5' are stored as different SQLite types
+        conn.executescript("""
+            DROP TABLE roster;
+            CREATE TABLE roster (run_id, character_id);
+            INSERT INTO roster VALUES (5, 'a'), ('5', 'b'), (6, 'c');
+        """)
+        conn.close()
+
+        repo = InMemoryDungeonRepository(self.db_path)
+        self.assertEqual(repo.get_roster("5"), ["a", "b"])
+        self.assertEqual(repo.get_roster("6"), ["c"])
+
+    def test_inmemory_roster_keeps_null_run_id_separate(self):
+        conn = sqlite3.connect(self.db_path)
+        # NULL sorts first; its members must not leak into the first real run
+        conn.executescript("""
+            DELETE FROM roster;
+            INSERT INTO roster VALUES (NULL, 'ghost'), (1, 'a'), (1, 'b'), (2, 'c');
+        """)
+        conn.close()
+
+        repo = InMemoryDungeonRepository(self.db_path)
+        self.assertEqual(repo.get_roster("1"), ["a", "b"])
+        self.assertEqual(repo.get_roster("2"), ["c"])
+        self.assertEqual(repo.get_roster("None"), ["ghost"])
+
+    def test_inmemory_loads_null_ids(self):
+        conn = sqlite3.connect(self.db_path)
+        conn.executescript("""
+            DELETE FROM roster;
+            INSERT INTO roster VALUES ('run1', 'a'), ('run1', NULL);
+            INSERT INTO character_dungeon_stats
+            VALUES (NULL, 'Dungeon A', 20, '2025-01-01T12:00:00.000Z', 'run1'),
+                   ('char1', NULL, 20, '2025-01-01T12:00:00.000Z', 'run1');
+        """)
+        conn.close()
+
+        repo = InMemoryDungeonRepository(self.db_path)
+        self.assertEqual(repo.get_roster("run1"), ["a", None])
+        self.assertEqual(repo.get_max_level_by_dungeon("char1", self.dungeons, 25, 12, "2025-01-10T00:00:00.000Z"),
+                         {"Dungeon A": 20, "Dungeon B": 21, "Dungeon C": 20})
+
+    def test_inmemory_matches_sqlite(self):
+        repo = self._get_repo()
+        memory_repo = InMemoryDungeonRepository(self.db_path)
+
+        for character_id in ["char1", "char2", "char3", "unknown"]:
+            for before in ["2025-01-01T12:00:00.000Z", "2025-01-05T00:00:00.000Z", "2025-01-10T00:00:00.000Z"]:
+                self.assertEqual(
+                    memory_repo.get_max_level_by_dungeon(character_id, self.dungeons, 25, 12, before),
+                    repo.get_max_level_by_dungeon(character_id, self.dungeons, 25, 12, before)
+                )
+                self.assertEqual(
+                    memory_repo.get_resilience_level(character_id, self.dungeons, 25, 12, before),
+                    repo.get_resilience_level(character_id, self.dungeons, 25, 12, before)
+                )
+                for dungeon in self.dungeons:
+                    self.assertEqual(
+                        memory_repo.has_higher_completion(character_id, dungeon, 20, before),
+                        repo.has_higher_completion(character_id, dungeon, 20, before)
+                    )
+            for dungeon in self.dungeons:
+                self.assertEqual(
+                    memory_repo.get_min_completion_date(character_id, dungeon, 20),
+                    repo.get_min_completion_date(character_id, dungeon, 20)
+                )
+                self.assertEqual(
+                    memory_repo.get_completion(character_id, dungeon, 20),
+                    repo.get_completion(character_id, dungeon, 20)
+                )
+            self.assertEqual(
+                memory_repo.scan_character_completions(character_id, 20, self.dungeons),
+                repo.scan_character_completions(character_id, 20, self.dungeons)
+            )
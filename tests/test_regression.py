@@ -1,53 +1,323 @@
-import unittest
+import functools
+import hashlib
 import json
 import os
+import pickle
+import shutil
+import sys
+from importlib import metadata
 from pathlib import Path
+from types import MappingProxyType
+
+import pytest
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import ijson
+except ImportError:
+    ijson = None
+
+try:
+    import blake3
+except ImportError:
+    blake3 = None
 
 
 BASELINE_DIR = Path("tests/baselines")
-DB_DIR = Path(".")  # .db files live at project root
 
 REGIONS = ["eu", "na"]
 SEASON = "tww-season3"
 KEY_LEVELS = list(range(18, 25))
 
 
+def _pipeline_db_path(region: str, season: str = SEASON) -> Path:
+    """The DB main.py reads for a region (Config.db_path, at the project root)."""
+    from main import Config
+
+    return Path(Config(region=region, season=season).db_path)
+
+
+def _env_flag(name: str) -> bool:
+    """True only when the environment variable is set to exactly "1"."""
+    return os.environ.get(name) == "1"
+
+
+# (region, key_level) -> output kind -> baseline file, built once at import
+BASELINE_PATHS = {
+    (region, key_level): {
+        kind: BASELINE_DIR / region / SEASON / f"{SEASON}-{region}-resi{key_level}_{kind}.json"
+        for kind in ("timestamps", "down_edges", "non_resil_edges")
+    }
+    for region in REGIONS for key_level in KEY_LEVELS
+}
+
+# Regions whose DB is present, checked once at collection; cases for the others are not generated
+AVAILABLE_DBS = {region for region in REGIONS if _pipeline_db_path(region).exists()}
+CASES = [(region, key_level) for region, key_level in BASELINE_PATHS if region in AVAILABLE_DBS]
+
+# Set RESI_RECORD=1 to also run (region, level) pairs that have no baseline, checking
+# that they really have no resilient characters; otherwise such pairs are skipped
+RECORD = _env_flag("RESI_RECORD")
+# Set RESI_REBASELINE=1 to overwrite the baselines with the current outputs instead of
+# comparing. They are copied byte-for-byte from ResultWriter (orjson when installed,
+# identical to stdlib json), so rebaselined files match what the pipeline ships
+REBASELINE = _env_flag("RESI_REBASELINE")
+# Set RESI_BAKE_BASELINES=1 to write normalized-edge pickles next to the baselines
+BAKE_BASELINES = _env_flag("RESI_BAKE_BASELINES")
+# Bump whenever normalize_edges changes shape so stale pickles are ignored
+NORMALIZED_FORMAT = 2
+
+# Set RESI_RUN_CACHE=1 to reuse a case's pipeline outputs while the DB, these pipeline
+# sources, the installed dependencies and the run parameters are unchanged. Only the
+# latest run of each case is kept
+RUN_CACHE = _env_flag("RESI_RUN_CACHE")
+RUN_CACHE_DIR = Path(".regression-cache")
+PIPELINE_SOURCES = (
+    "main.py", "services.py", "repository.py", "inmemory_repository.py", "models.py",
+    "dungeons.json", "requirements.txt",
+)
+RESULT_FILES = ("timestamps_file", "down_edges_file", "non_resil_edges_file")
+
+
 def load_json(path: str):
+    if orjson is not None:
+        return orjson.loads(Path(path).read_bytes())
     with open(path, "r", encoding="utf-8") as f:
         return json.load(f)
 
 
+def _edge_key(edge: dict) -> tuple:
+    # Sorted tuple rather than frozenset: labels within an edge are unique, and a
+    # tuple is cheaper to build and hash while comparing the same way
+    return (edge["source"], edge["target"], tuple(sorted(edge["labels"])))
+
+
 def normalize_edges(edges: list[dict]) -> set[tuple]:
-    """Convert edge list to a comparable set of (source, target, frozenset(labels))."""
-    result = set()
-    for edge in edges:
-        key = (edge["source"], edge["target"], frozenset(edge["labels"]))
-        result.add(key)
-    return result
+    """Convert edge list to a comparable set of (source, target, sorted labels tuple)."""
+    return set(map(_edge_key, edges))
+
+
+def stream_edge_set(path: str) -> set[tuple]:
+    """
+    Load an edge file straight into its normalized set. With ijson installed the
+    edges are parsed one at a time, so the full list of dicts never exists at once.
+    """
+    if ijson is not None:
+        with open(path, "rb") as f:
+            return set(map(_edge_key, ijson.items(f, "item")))
+    return normalize_edges(load_json(path))
+
+
+def _cache_key(path: Path) -> tuple:
+    """(path, mtime, size) so an edited baseline is re-read within the same session."""
+    stat = os.stat(path)
+    return str(path), stat.st_mtime_ns, stat.st_size
+
+
+@functools.lru_cache(maxsize=None)
+def _load_baseline_edges(path: str, mtime_ns: int, size: int) -> frozenset:
+    """Parse and normalize a baseline edge file once per process."""
+    return _baseline_normalized(path)
+
+
+def _baseline_normalized(path: str) -> frozenset:
+    """
+    Load normalized baseline edges from the `<path>.norm.pkl` sidecar when it is
+    at least as new as the JSON, otherwise normalize the JSON (and write the
+    sidecar when baking is enabled).
+    """
+    sidecar = Path(path + ".norm.pkl")
+    if sidecar.exists() and sidecar.stat().st_mtime_ns >= os.stat(path).st_mtime_ns:
+        with open(sidecar, "rb") as f:
+            fmt, edges = pickle.load(f)
+        if fmt == NORMALIZED_FORMAT:
+            return edges
+
+    edges = frozenset(stream_edge_set(path))
+    if BAKE_BASELINES:
+        with open(sidecar, "wb") as f:
+            pickle.dump((NORMALIZED_FORMAT, edges), f, protocol=5)
+    return edges
+
+
+@functools.lru_cache(maxsize=None)
+def _load_baseline_timestamps(path: str, mtime_ns: int, size: int) -> MappingProxyType:
+    """Parse a baseline timestamps file once per process (read-only, since it is shared)."""
+    return MappingProxyType(load_json(path))
 
 
-def run_analysis_for(region: str, season: str, key_level: int, max_level: int = 25) -> dict:
-    """Run the analysis pipeline and return paths to output files."""
-    from main import Config, AnalysisOrchestrator, DungeonConfigLoader
+@functools.lru_cache(maxsize=1)
+def _cached_dungeon_config() -> tuple:
+    """Load dungeons.json once per process; immutable since every test shares it."""
+    from main import DungeonConfigLoader
+
+    dungeons, dungeon_short = DungeonConfigLoader.load()
+    return tuple(dungeons), MappingProxyType(dungeon_short)
+
+
+@functools.lru_cache(maxsize=None)
+def _file_digest(path: str, mtime_ns: int, size: int) -> str:
+    """Content hash of a file (blake3 if installed, else sha256), read in 1 MiB chunks."""
+    h = blake3.blake3() if blake3 is not None else hashlib.sha256()
+    with open(path, "rb") as f:
+        while chunk := f.read(1 << 20):
+            h.update(chunk)
+    return h.hexdigest()
+
+
+def _dependency_versions() -> str:
+    """Python version plus the installed version of each requirements.txt package."""
+    versions = [sys.version]
+    for line in Path("requirements.txt").read_text(encoding="utf-8").splitlines():
+        name = line.split("#")[0].strip()
+        for separator in "<>=!~;[ ":
+            name = name.split(separator)[0]
+        if not name:
+            continue
+        try:
+            versions.append(f"{name}=={metadata.version(name)}")
+        except metadata.PackageNotFoundError:
+            versions.append(f"{name} not installed")
+    return "|".join(versions)
+
+
+def _run_cache_key(db_path: Path, region: str, season: str, key_level: int, max_level: int) -> str:
+    h = hashlib.sha256()
+    for path in (db_path, *map(Path, PIPELINE_SOURCES)):
+        h.update(_file_digest(*_cache_key(path)).encode())
+    h.update(_dependency_versions().encode())
+    h.update(f"{region}|{season}|{key_level}|{max_level}".encode())
+    return h.hexdigest()
+
+
+def _run_cache_dir(region: str, season: str, key_level: int, max_level: int) -> Path:
+    # One directory per case, so a new run replaces the old one instead of piling up
+    return RUN_CACHE_DIR / f"{season}-{region}-resi{key_level}-max{max_level}"
+
+
+def _load_cached_run(cache_dir: Path, key: str) -> tuple:
+    """Return (hit, results) when the cached run has this key and all its output files."""
+    index = cache_dir / "results.json"
+    if not index.exists():
+        return False, None
+    cached = load_json(str(index))
+    if cached["key"] != key:
+        return False, None
+    results = cached["results"]
+    if results is not None and not all(Path(results[k]).exists() for k in RESULT_FILES):
+        return False, None
+    return True, results
+
+
+def _store_cached_run(cache_dir: Path, key: str, results: dict):
+    """Copy the output files over the case's previous entry and index them under key."""
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    if results is not None:
+        results = dict(results)
+        for k in RESULT_FILES:
+            results[k] = str(shutil.copy2(results[k], cache_dir / Path(results[k]).name))
+    # Write-then-rename so an interrupted run never leaves a truncated index behind
+    tmp_index = cache_dir / "results.json.tmp"
+    with open(tmp_index, "w", encoding="utf-8") as f:
+        json.dump({"key": key, "results": results}, f)
+    os.replace(tmp_index, cache_dir / "results.json")
+
+
+def _rebaseline(results, baselines: dict):
+    """Replace a case's baseline files with its outputs, or remove them when there are none."""
+    for kind, baseline_path in baselines.items():
+        if results is None:
+            baseline_path.unlink(missing_ok=True)
+        else:
+            baseline_path.parent.mkdir(parents=True, exist_ok=True)
+            shutil.copyfile(results[f"{kind}_file"], baseline_path)
+
+
+def run_analysis_for(region: str, season: str, key_level: int, max_level: int = 25,
+                     db_path_override: str = None, shared_orchestrator=None) -> dict:
+    """
+    Run the analysis pipeline and return paths to output files.
+    With RESI_RUN_CACHE=1, a run whose DB, pipeline sources, dependencies and
+    parameters match the case's previous one returns that run's cached outputs.
+
+    shared_orchestrator: optional callable (region, season, max_level) returning an
+    orchestrator over Config.db_path, reused across key levels via
+    run_for_level. It is only called on a cache miss, so cached runs never load the
+    DB. It cannot be combined with db_path_override.
+    """
+    from main import Config, AnalysisOrchestrator
+
+    if shared_orchestrator is not None and db_path_override is not None:
+        raise ValueError("shared_orchestrator always reads Config.db_path; drop db_path_override")
 
     config = Config(
         region=region,
         season=season,
         resi_key_level=key_level,
         max_level=max_level,
+        db_path_override=db_path_override,
     )
 
-    dungeons, dungeon_short = DungeonConfigLoader.load()
-    orchestrator = AnalysisOrchestrator(config, dungeons, dungeon_short)
+    if RUN_CACHE:
+        cache_dir = _run_cache_dir(region, season, key_level, max_level)
+        cache_key = _run_cache_key(Path(config.db_path), region, season, key_level, max_level)
+        hit, results = _load_cached_run(cache_dir, cache_key)
+        if hit:
+            return results
+
+    if shared_orchestrator is not None:
+        orchestrator = shared_orchestrator(region, season, max_level)
+        shared = orchestrator.config
+        assert (shared.region, shared.season, shared.max_level) == (region, season, max_level), \
+            f"Shared orchestrator is for {shared}, not {region}/{season}/max{max_level}"
+        results = orchestrator.run_for_level(key_level)
+    else:
+        dungeons, dungeon_short = _cached_dungeon_config()
+        orchestrator = AnalysisOrchestrator(config, dungeons, dungeon_short)
+
+        try:
+            results = orchestrator.run_analysis()
+        finally:
+            orchestrator.cleanup()
+
+    if RUN_CACHE:
+        _store_cached_run(cache_dir, cache_key, results)
+    return results
+
+
+@pytest.fixture(scope="module")
+def orchestrators():
+    """
+    One AnalysisOrchestrator per (region, season, max_level), created on first use
+    over that region's Config.db_path and shared by all its key levels, so each DB
+    is loaded once.
+    """
+    from main import Config, AnalysisOrchestrator
+
+    created = {}
+
+    def get(region: str, season: str, max_level: int):
+        key = (region, season, max_level)
+        if key not in created:
+            config = Config(
+                region=region,
+                season=season,
+                resi_key_level=KEY_LEVELS[0],
+                max_level=max_level,
+            )
+            created[key] = AnalysisOrchestrator(config, *_cached_dungeon_config())
+        return created[key]
 
-    try:
-        results = orchestrator.run_analysis()
-        return results
-    finally:
+    yield get
+    for orchestrator in created.values():
         orchestrator.cleanup()
 
 
-class TestRegression(unittest.TestCase):
+class TestRegression:
     """
     Run the full analysis pipeline against real .db files and compare
     outputs to known-good baselines.
@@ -57,78 +327,82 @@ class TestRegression(unittest.TestCase):
             {season}-{region}-resi{level}_timestamps.json
             {season}-{region}-resi{level}_down_edges.json
             {season}-{region}-resi{level}_non_resil_edges.json
-    """
 
-    def _baseline_path(self, region: str, level: int, suffix: str) -> Path:
-        return BASELINE_DIR / region / SEASON / f"{SEASON}-{region}-resi{level}_{suffix}.json"
+    Cases are independent and write distinct output files, so they can be
+    spread over all cores with pytest-xdist (requirements-dev.txt):
+        pytest -n auto tests/test_regression.py
+
+    Each case has an id like "eu-resi20", so cases can be picked with -k
+    and failures re-run on their own with pytest's last-failed cache:
+        pytest tests/test_regression.py -k "na and resi22"
+        pytest --lf tests/test_regression.py
+
+    After an intended output change, regenerate the baselines with:
+        RESI_REBASELINE=1 pytest tests/test_regression.py
+
+    Repeated runs over unchanged code and DBs can reuse earlier outputs with:
+        RESI_RUN_CACHE=1 pytest tests/test_regression.py
+    """
 
     def _assert_timestamps_match(self, actual_path: str, baseline_path: Path):
         actual = load_json(actual_path)
-        baseline = load_json(str(baseline_path))
-        self.assertEqual(actual, baseline, f"Timestamps mismatch: {actual_path}")
+        baseline = _load_baseline_timestamps(*_cache_key(baseline_path))
+        # Mapping equality ignores key order and formatting, so orjson- and json-written files compare equal
+        assert actual == baseline, f"Timestamps mismatch: {actual_path}"
 
     def _assert_edges_match(self, actual_path: str, baseline_path: Path):
-        actual = normalize_edges(load_json(actual_path))
-        baseline = normalize_edges(load_json(str(baseline_path)))
-
-        missing = baseline - actual
-        extra = actual - baseline
+        actual = stream_edge_set(actual_path)
+        baseline = _load_baseline_edges(*_cache_key(baseline_path))
+        # Compare the sets themselves: an order-independent digest of them can
+        # report a false match (e.g. XOR-combined hashes of duplicate edges cancel)
+        if actual == baseline:
+            return
 
-        self.assertEqual(
-            actual, baseline,
+        # One pass finds every differing edge, then split it by side for the report
+        diff = actual ^ baseline
+        missing = diff & baseline
+        extra = diff & actual
+        pytest.fail(
             f"Edge mismatch in {actual_path}:\n"
             f"  Missing {len(missing)} edges\n"
             f"  Extra {len(extra)} edges"
         )
 
-
-def _make_test(region, key_level):
-    """Factory that creates a test method for a specific region + key_level."""
-
-    def test_method(self):
-        db_path = DB_DIR / f"{SEASON}-{region}.db"
-        if not db_path.exists():
-            self.skipTest(f"DB not found: {db_path}")
-
-        results = run_analysis_for(region, SEASON, key_level)
+    @pytest.mark.parametrize("region,key_level", CASES, ids=[
+        f"{region}-resi{key_level}" for region, key_level in CASES
+    ])
+    def test_regression(self, region: str, key_level: int, orchestrators):
+        """Regression: one (region, key_level) pipeline run against its baselines."""
+        # Without a baseline there is nothing to compare against, so skip the pipeline run
+        baselines = BASELINE_PATHS[region, key_level]
+        baseline_ts = baselines["timestamps"]
+        if not baseline_ts.exists() and not (RECORD or REBASELINE):
+            pytest.skip(f"No baseline: {baseline_ts} (set RESI_RECORD=1 to check it)")
+
+        results = run_analysis_for(region, SEASON, key_level, shared_orchestrator=orchestrators)
+
+        if REBASELINE:
+            _rebaseline(results, baselines)
+            return
 
         if results is None:
             # No resilient characters at this level — baseline should not exist either
-            baseline_ts = self._baseline_path(region, key_level, "timestamps")
-            self.assertFalse(
-                baseline_ts.exists(),
+            assert not baseline_ts.exists(), \
                 f"Analysis returned None but baseline exists: {baseline_ts}"
-            )
             return
 
+        assert baseline_ts.exists(), \
+            f"Analysis found resilient characters but baseline is missing: {baseline_ts}"
+
         # Compare timestamps
-        self._assert_timestamps_match(
-            results["timestamps_file"],
-            self._baseline_path(region, key_level, "timestamps"),
-        )
+        self._assert_timestamps_match(results["timestamps_file"], baseline_ts)
 
         # Compare resilient edges
-        self._assert_edges_match(
-            results["down_edges_file"],
-            self._baseline_path(region, key_level, "down_edges"),
-        )
+        self._assert_edges_match(results["down_edges_file"], baselines["down_edges"])
 
         # Compare non-resilient edges
-        self._assert_edges_match(
-            results["non_resil_edges_file"],
-            self._baseline_path(region, key_level, "non_resil_edges"),
-        )
-
-    test_method.__doc__ = f"Regression: {region} resi{key_level}"
-    return test_method
-
-
-# Dynamically generate one test per (region, key_level)
-for _region in REGIONS:
-    for _level in KEY_LEVELS:
-        method_name = f"test_{_region}_resi{_level}"
-        setattr(TestRegression, method_name, _make_test(_region, _level))
+        self._assert_edges_match(results["non_resil_edges_file"], baselines["non_resil_edges"])
 
 
 if __name__ == "__main__":
-    unittest.main()
\ No newline at end of file
+    raise SystemExit(pytest.main([__file__]))
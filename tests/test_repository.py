@@ -1,7 +1,8 @@
 import unittest
 
+from models import DungeonCompletion
 from services import ResilienceCalculator
-from tests.test_services import MockDungeonRepository
+from tests.test_services import MockDungeonRepository, FrozenMockDungeonRepository
 
 class TestMockRepository(unittest.TestCase):
     """Tests using mock repository."""
@@ -28,4 +29,25 @@ class TestMockRepository(unittest.TestCase):
             25
         )
         
-        self.assertEqual(result, 20)  # Minimum of [20, 22, 21]
\ No newline at end of file
+        self.assertEqual(result, 20)  # Minimum of [20, 22, 21]
+    
+    def test_resilience_with_frozen_mock(self):
+        """Test a frozen mock answers like the mutable one and rejects mutation."""
+        frozen_repo = FrozenMockDungeonRepository({
+            "test_char": {"Dungeon A": 20, "Dungeon B": 22, "Dungeon C": 21}
+        })
+        
+        result = ResilienceCalculator(frozen_repo).calculate_resilience_level(
+            "test_char",
+            "2025-09-24T20:38:11.000Z",
+            ["Dungeon A", "Dungeon B", "Dungeon C"],
+            25
+        )
+        
+        self.assertEqual(result, 20)
+        with self.assertRaises(TypeError):
+            frozen_repo.max_levels["test_char"]["Dungeon A"] = 25
+        with self.assertRaises(TypeError):
+            frozen_repo.add_completion(
+                DungeonCompletion("test_char", "Dungeon A", 25, "2025-09-20T00:00:00.000Z", "run")
+            )
\ No newline at end of file
@@ -1,4 +1,6 @@
 import unittest
+from collections import defaultdict
+from types import MappingProxyType
 from unittest.mock import Mock
 from datetime import datetime
 from typing import List, Optional, Dict
@@ -15,6 +17,14 @@ class MockDungeonRepository(DungeonRepository):
         self.completions = {}
         self.rosters = {}
         self.max_levels = {}
+        # character_id -> dungeon -> completions, kept in sync by add_completion
+        self._by_char: Dict[str, Dict[str, List[DungeonCompletion]]] = defaultdict(lambda: defaultdict(list))
+    
+    def add_completion(self, completion: DungeonCompletion):
+        """Register a completion in both the lookup dict and the per-character index."""
+        key = (completion.character_id, completion.dungeon_name, completion.difficulty_level)
+        self.completions[key] = completion
+        self._by_char[completion.character_id][completion.dungeon_name].append(completion)
     
     def get_all_characters(self) -> List[str]:
         return self.characters
@@ -28,7 +38,18 @@ class MockDungeonRepository(DungeonRepository):
     
     def get_max_level_by_dungeon(self, character_id: str, dungeons: List[str],
                                 max_level: int, min_level: int, before: str) -> dict[str, int]:
-        return self.max_levels.get(character_id, {})
+        if character_id in self.max_levels:
+            levels = self.max_levels[character_id]
+            return {dungeon: levels[dungeon] for dungeon in dungeons if dungeon in levels}
+        # Otherwise derive from completions, touching only this character's entries
+        by_dungeon = self._by_char.get(character_id, {})
+        levels = {
+            dungeon: max((c.difficulty_level for c in by_dungeon.get(dungeon, ())
+                          if min_level <= c.difficulty_level <= max_level and c.first_completed < before),
+                         default=0)
+            for dungeon in dungeons
+        }
+        return {dungeon: level for dungeon, level in levels.items() if level}
     
     def get_min_completion_date(self, character_id: str, dungeon: str, min_level: int) -> Optional[str]:
         return None
@@ -36,6 +57,24 @@ class MockDungeonRepository(DungeonRepository):
     def get_roster(self, run_id: str) -> List[str]:
         return self.rosters.get(run_id, [])
 
+class FrozenMockDungeonRepository(MockDungeonRepository):
+    """
+    Read-only mock whose max levels are fixed at construction, so one instance
+    can be shared across many tests without per-test setUp.
+    """
+    
+    def __init__(self, max_levels: Dict[str, Dict[str, int]]):
+        super().__init__()
+        self.characters = ()
+        self.completions = MappingProxyType({})
+        self.rosters = MappingProxyType({})
+        self.max_levels = MappingProxyType(
+            {character_id: MappingProxyType(dict(levels)) for character_id, levels in max_levels.items()}
+        )
+    
+    def add_completion(self, completion: DungeonCompletion):
+        raise TypeError("FrozenMockDungeonRepository is read-only")
+
 class TestResilienceCalculator(unittest.TestCase):
     
     def setUp(self):
@@ -65,6 +104,34 @@ class TestResilienceCalculator(unittest.TestCase):
         )
         
         self.assertEqual(result, 0)  # Not resilient
+    
+    def test_max_levels_from_completions(self):
+        """Test max levels derived from completions added to the mock."""
+        for dungeon, level, completed in [
+            ("dng1", 20, "2025-09-20T00:00:00.000Z"),
+            ("dng1", 22, "2025-09-30T00:00:00.000Z"),  # After the cutoff
+            ("dng2", 21, "2025-09-21T00:00:00.000Z"),
+            ("dng3", 20, "2025-09-22T00:00:00.000Z"),
+        ]:
+            self.repo.add_completion(DungeonCompletion("char1", dungeon, level, completed, "run"))
+        
+        result = self.calculator.calculate_resilience_level(
+            "char1", "2025-09-24T20:38:11.000Z", ["dng1", "dng2", "dng3"], 25
+        )
+        
+        self.assertEqual(result, 20)
+        self.assertIsNotNone(self.repo.get_completion("char1", "dng2", 21))
+    
+    def test_resilience_depends_on_dungeon_list(self):
+        """Test the same character and time give different results for different dungeon lists."""
+        self.repo.max_levels = {"c": {"A": 20, "B": 18}}
+        
+        self.assertEqual(
+            self.calculator.calculate_resilience_level("c", "2025-09-24T20:38:11.000Z", ["A"], 25), 20
+        )
+        self.assertEqual(
+            self.calculator.calculate_resilience_level("c", "2025-09-24T20:38:11.000Z", ["A", "B", "C"], 25), 0
+        )
 
 if __name__ == '__main__':
     unittest.main()
\ No newline at end of file
@@ -1,6 +1,8 @@
 import unittest
+from pathlib import Path
 
 from main import AnalysisOrchestrator, Config
+from tests._utils import index_edges
 
 class TestEdgeSerializer(unittest.TestCase):
     """Unit tests for edge serialization."""
@@ -8,13 +10,11 @@ class TestEdgeSerializer(unittest.TestCase):
     def test_edge_grouping(self):
         """Test that edges are grouped by (source, target)."""
         from main import EdgeSerializer
-        from models import PropagationEdge
         
-        edges = [
-            PropagationEdge("A", "B", "Dungeon1", "run1"),
-            PropagationEdge("A", "B", "Dungeon2", "run2"),
-            PropagationEdge("C", "D", "Dungeon1", "run3"),
-        ]
+        edges = {
+            ("A", "B"): {("Dungeon1", "run1"): None, ("Dungeon2", "run2"): None},
+            ("C", "D"): {("Dungeon1", "run3"): None},
+        }
         
         dungeon_short = {"Dungeon1": "D1", "Dungeon2": "D2"}
         
@@ -23,11 +23,40 @@ class TestEdgeSerializer(unittest.TestCase):
         # Should have 2 groups: (A,B) and (C,D)
         self.assertEqual(len(result), 2)
         
-        # Find A->B group
-        ab_group = next(g for g in result if g["source"] == "A")
+        groups_by_endpoints = index_edges(result)
+        ab_group = groups_by_endpoints[("A", "B")]
         self.assertEqual(len(ab_group["labels"]), 2)
         self.assertIn("D1#run1", ab_group["labels"])
         self.assertIn("D2#run2", ab_group["labels"])
+        self.assertEqual(groups_by_endpoints[("C", "D")]["labels"], ["D1#run3"])
+        self.assertEqual(EdgeSerializer.count(edges), 3)
+
+class TestResultWriter(unittest.TestCase):
+    """Unit tests for result writing."""
+    
+    def test_orjson_and_json_write_identical_bytes(self):
+        """Test that the orjson fast path matches the stdlib json output."""
+        import os
+        import tempfile
+        from unittest import mock
+        import main
+        from main import ResultWriter
+        
+        if main.orjson is None:
+            self.skipTest("orjson not installed")
+        
+        timestamps = {"b-char": "2025-01-02", "a-char": "2025-01-01"}
+        edges = [{"source": "A", "target": "B", "labels": ["D1#run1", "D2#run2"]}]
+        
+        with tempfile.TemporaryDirectory() as tmp:
+            outputs = []
+            for module in (main.orjson, None):
+                with mock.patch.object(main, "orjson", module):
+                    writer = ResultWriter(os.path.join(tmp, f"out-{module is None}"))
+                    paths = [writer.write_timestamps(timestamps), writer.write_edges(edges, "down")]
+                outputs.append([Path(p).read_bytes() for p in paths])
+        
+        self.assertEqual(outputs[0], outputs[1])
 
 class TestConfigLoader(unittest.TestCase):
     """Unit tests for configuration loading."""
@@ -46,4 +75,27 @@ class TestConfigLoader(unittest.TestCase):
         config = Config(region="us", season="test-s1", resi_key_level=18)
         
         self.assertEqual(config.db_path, "test-s1-us.db")
-        self.assertEqual(config.output_prefix, "test-s1-us-resi18")
\ No newline at end of file
+        self.assertEqual(config.output_prefix, "test-s1-us-resi18")
+    
+    def test_db_path_override(self):
+        """Test that an explicit DB path replaces the derived one."""
+        config = Config(region="us", season="test-s1", db_path_override="/tmp/copy.db")
+        
+        self.assertEqual(config.db_path, "/tmp/copy.db")
+
+class TestAnalysisOrchestrator(unittest.TestCase):
+    """Unit tests for orchestrator wiring."""
+    
+    def test_injected_repository_is_kept_even_if_falsy(self):
+        """Test that a repository defining __len__ == 0 is not replaced by a load from disk."""
+        from tests.test_services import MockDungeonRepository
+        
+        class EmptyRepository(MockDungeonRepository):
+            def __len__(self):
+                return 0
+        
+        repository = EmptyRepository()
+        config = Config(region="us", season="test-s1", db_path_override="/nonexistent/missing.db")
+        orchestrator = AnalysisOrchestrator(config, [], {}, repository=repository)
+        
+        self.assertIs(orchestrator.repository, repository)